@@ -1,15 +1,15 @@
-python
 import os
+import sys
 import math
 import argparse
 import datetime
 
 from src import config
-from src.logging_utils import setup_logging, log_event, get_final_token_summary
-from src.dataset_utils import get_prepared_dataset
-from src.agent_utils import save_agent_code
+from src.logging_utils import setup_logging, log_event, get_final_token_summary, get_client
+from src.dataset_utils import get_prepared_dataset, prepare_eval_views
+from src.agent_utils import save_agent_code, ensure_agent_dir_on_path
 from src.agents.creator import create_initial_agent
-from src.evolution.dgm_loop import run_dgm_loop
+from src.evolution.evolution_loop import run_dgm_loop
 from src.evolution.evaluation import evaluate_agent_on_dataset
 from src.agent_utils import load_agent_from_file
 
@@ -25,7 +25,12 @@ def main(args):
     log_folder = f"evolution_logs/run_{run_timestamp}"
     
     os.makedirs(agent_folder, exist_ok=True)
+    # Agents may import sibling modules; add their folder to the path once
+    ensure_agent_dir_on_path(agent_folder)
     setup_logging(log_folder)
+    get_client() # Fail fast if OPENAI_API_KEY is missing
+    config.DEV_CACHE_ENABLED = not args.no_dev_cache
+    config.EVAL_WORKERS = args.eval_workers
     
     # --- 2. Calculate Derived DGM Parameters ---
     # User Request: Lambda is inversely proportional to iteration count.
@@ -40,12 +45,14 @@ def main(args):
         "sigmoid_lambda": calculated_lambda,
         "sigmoid_alpha0": args.alpha0
     }
-    log_event("run_config.json", {"args": vars(args), "dgm_params": dgm_params})
+    log_event("run_config.json", {"args": vars(args), "dgm_params": dgm_params}, pretty=True)
 
     # --- 3. Load Dataset ---
     novo_dataset = get_prepared_dataset(args.dataset_name)
     if novo_dataset is None:
         raise RuntimeError(f"Failed to load dataset: {args.dataset_name}. Aborting.")
+    # Ground-truth answers are extracted once and reused by every evaluation
+    eval_views = prepare_eval_views(novo_dataset)
 
     # --- 4. Create or Load v0 Agent ---
     starting_agent_filename = "math_agent_v0.py"
@@ -77,7 +84,7 @@ def main(args):
 
     # --- 5. Run the DGM Loop ---
     best_agent_data = run_dgm_loop(
-        dataset=novo_dataset, 
+        dataset=eval_views, 
         start_agent_path=agent_v0_path,
         agent_folder=agent_folder,
         num_iterations=args.iterations,
@@ -93,7 +100,7 @@ def main(args):
         
         best_agent_module = load_agent_from_file(best_agent_data['path'], best_agent_data['id'])
         
-        test_score = evaluate_agent_on_dataset(best_agent_module, novo_dataset['test'])
+        test_score = evaluate_agent_on_dataset(best_agent_module, eval_views['test'], best_agent_data['path'], args.task_model)
         
         print("=" * 52)
         print(f"FINAL TEST SET SCORE: {test_score:.4f}")
@@ -105,7 +112,7 @@ def main(args):
     
     # --- 7. Log Final Token Usage ---
     print(get_final_token_summary())
-    log_event("token_summary.json", config.token_usage_stats)
+    log_event("token_summary.json", config.token_usage_stats, pretty=True)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the DGM Agent Evolution loop.")
@@ -130,6 +137,12 @@ if __name__ == "__main__":
     
     parser.add_argument('--alpha0', type=float, default=config.DEFAULT_SIGMOID_ALPHA0,
                         help='Sigmoid midpoint (alpha_0) for parent selection.')
+    
+    parser.add_argument('--eval_workers', type=int, default=config.EVAL_WORKERS,
+                        help='Worker processes that run agents during evolution (0 = in-process).')
+    
+    parser.add_argument('--no_dev_cache', '--no-dev-cache', dest='no_dev_cache', action='store_true',
+                        help='Always call the Developer Agent, even for a previously seen prompt.')
 
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -1,22 +1,44 @@
 import os
 import re
+import ast
 import sys
 import importlib.util
 import traceback
+from types import ModuleType
 from src.logging_utils import log_event
 
-def clean_generated_code(code_string: str) -> str:
-    """Robustly extracts Python code from LLM-generated markdown."""
+# --- Precompiled Patterns ---
+_PY_BLOCK = re.compile(r"```python\s*([\s\S]+?)\s*```")
+_ANY_BLOCK = re.compile(r"```\s*([\s\S]+?)\s*```")
+_HASH_NUM = re.compile(r"####\s*([0-9,.]+)")
+_ANY_NUM = re.compile(r"([0-9,.]+)")
+_ANSWER_TAIL_CHARS = 256
+
+# Loaded agent modules, keyed by (absolute path, mtime in ns)
+_MODULE_CACHE: dict[tuple[str, int], ModuleType] = {}
+
+# This regex looks for model strings like "gpt-4", "claude-3", etc.
+_MODEL_RE = re.compile(rb"""model\s*=\s*["'](gpt-[\w.-]+|claude-[\w.-]+|gemini-[\w.-]+)["']""", re.IGNORECASE)
+_MODEL_PREFIXES = (b"gpt-", b"claude-", b"gemini-")
+
+def clean_generated_code(code_string: str, python_fenced: bool = False) -> str:
+    """
+    Robustly extracts Python code from LLM-generated markdown.
+    `python_fenced` signals the text is known to open with ```python; only
+    Pattern 1 can then match, so the other scans are skipped.
+    """
     if code_string is None:
         return ""
     
     # Pattern 1: ```python ... ```
-    match = re.search(r"```python\s*([\s\S]+?)\s*```", code_string, re.DOTALL)
+    match = _PY_BLOCK.search(code_string)
     if match:
         return match.group(1).strip()
+    if python_fenced:
+        return code_string.strip() # Fallback
     
     # Pattern 2: ``` ... ``` (no language specified)
-    match = re.search(r"```\s*([\s\S]+?)\s*```", code_string, re.DOTALL)
+    match = _ANY_BLOCK.search(code_string)
     if match:
         return match.group(1).strip()
     
@@ -37,6 +59,13 @@ def save_agent_code(folder: str, filename: str, code: str):
     except IOError as e:
         print(f"Error saving agent code to {filepath}: {e}")
 
+def _last_match(pattern: re.Pattern, text: str) -> str | None:
+    """Returns group 1 of the last match of `pattern`, without building a list of all matches."""
+    last = None
+    for match in pattern.finditer(text):
+        last = match
+    return last.group(1) if last is not None else None
+
 def extract_final_answer(text: str) -> str:
     """
     Extracts the final numeric answer from gsm8k-formatted text.
@@ -45,53 +74,66 @@ def extract_final_answer(text: str) -> str:
     text = str(text)
     
     # Main pattern: #### 123
-    matches = re.findall(r"####\s*([0-9,.]+)", text)
-    if matches:
-        number_str = matches[-1].replace(",", "").strip()
+    # '####' conventionally ends the output, so scan the tail first. A match
+    # found there is also the last match overall; otherwise scan everything.
+    number_str = _last_match(_HASH_NUM, text[-_ANSWER_TAIL_CHARS:])
+    if number_str is None and len(text) > _ANSWER_TAIL_CHARS:
+        number_str = _last_match(_HASH_NUM, text)
+    if number_str is not None:
+        number_str = number_str.replace(",", "").strip()
         # NORMALIZATION: Remove trailing period (e.g., "3." -> "3")
         # This will not affect valid decimals (e.g., "1.5")
         normalized_str = number_str.rstrip(".")
         return normalized_str
 
     # Fallback: If '####' is missing, get the last number in the string
-    fallback_matches = re.findall(r"([0-9,.]+)", text)
-    if fallback_matches:
-        number_str = fallback_matches[-1].replace(",", "").strip()
+    number_str = _last_match(_ANY_NUM, text)
+    if number_str is not None:
+        number_str = number_str.replace(",", "").strip()
         normalized_str = number_str.rstrip(".")
         return normalized_str
         
     return "" # No answer found
 
+def ensure_agent_dir_on_path(directory: str):
+    """Puts an agent folder on sys.path (once) so agents can import sibling modules."""
+    directory = os.path.abspath(directory)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
 def load_agent_from_file(filepath: str, module_name: str):
     """
     Dynamically loads a Python module from a file path.
+    Modules are cached by (path, mtime), so an unchanged file is executed once.
     Returns the loaded module or None on failure.
     """
     try:
         abs_filepath = os.path.abspath(filepath)
-        spec = importlib.util.spec_from_file_location(module_name, abs_filepath)
+        mtime_ns = os.stat(abs_filepath).st_mtime_ns
+        cache_key = (abs_filepath, mtime_ns)
+        cached_module = _MODULE_CACHE.get(cache_key)
+        if cached_module is not None:
+            return cached_module
+
+        # Unique per file version, so the module can stay in sys.modules
+        unique_name = f"{module_name}@{mtime_ns}"
+        spec = importlib.util.spec_from_file_location(unique_name, abs_filepath)
         if spec is None:
             print(f"Error: Could not create module spec from {filepath}")
             return None
             
         agent_module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = agent_module
-        
-        # Temporarily add module's directory to path for relative imports
-        module_dir = os.path.dirname(abs_filepath)
-        if module_dir not in sys.path:
-            sys.path.insert(0, module_dir)
-            
-        spec.loader.exec_module(agent_module)
+        sys.modules[unique_name] = agent_module
         
-        # Clean up sys.path
-        if sys.path[0] == module_dir:
-            sys.path.pop(0)
-            
-        # Clean up sys.modules to allow reloading next time
-        if module_name in sys.modules:
-            del sys.modules[module_name] 
+        # No-op after the first agent from a folder (main.py also adds it at startup)
+        ensure_agent_dir_on_path(os.path.dirname(abs_filepath))
+        try:
+            spec.loader.exec_module(agent_module)
+        except BaseException:
+            sys.modules.pop(unique_name, None)
+            raise
             
+        _MODULE_CACHE[cache_key] = agent_module
         return agent_module
         
     except Exception as e:
@@ -100,29 +142,81 @@ def load_agent_from_file(filepath: str, module_name: str):
         log_event("fatal_errors.log", f"Failed to load agent {filepath}:\n{traceback.format_exc()}")
         return None
 
+def check_agent_functional(agent_module) -> tuple[bool, str]:
+    """
+    Load-time check that an agent can actually run: it defines `run_agent`, and
+    if it builds its graph lazily (`_get_app`, see templates.py) the build succeeds.
+    Returns (True, "") or (False, reason).
+    """
+    if agent_module is None:
+        return False, "Module failed to load."
+    if not hasattr(agent_module, 'run_agent'):
+        return False, "Module has no 'run_agent'."
+    get_app = getattr(agent_module, '_get_app', None)
+    if callable(get_app):
+        try:
+            get_app()
+        except Exception as e:
+            reason = ''.join(traceback.format_exception_only(type(e), e)).strip()
+            return False, f"Agent graph failed to build: {reason}"
+    return True, ""
+
 def validate_agent_model_usage(code_string: str, allowed_model: str) -> bool:
     """
     Checks if the agent code tries to use a different LLM model.
     """
-    # This regex looks for model strings like "gpt-4", "claude-3", etc.
-    model_pattern = re.compile(r"""
-        model\s*=\s*['"](
-            gpt-[\w.-]+ |
-            claude-[\w.-]+ |
-            gemini-[\w.-]+
-        )['"]
-    """, re.IGNORECASE | re.VERBOSE)
-    
-    found_models = model_pattern.findall(code_string)
-    
-    if not found_models:
-        return True # No model definitions found, pass.
+    code_bytes = code_string.encode()
+    allowed = allowed_model.strip().encode()
 
-    for model in found_models:
+    # Fast path: once the quoted allowed model is removed, no model-like
+    # string is left, so no model definition can disagree with it.
+    rest = code_bytes.replace(b'"' + allowed + b'"', b"").replace(b"'" + allowed + b"'", b"").lower()
+    if not any(prefix in rest for prefix in _MODEL_PREFIXES):
+        return True
+
+    for match in _MODEL_RE.finditer(code_bytes):
+        model = match.group(1).decode()
         if model.strip() != allowed_model.strip():
             print(f"  [Validation] FAILED: Agent code specifies invalid model '{model}'. Allowed: '{allowed_model}'.")
             log_event("invalid_agents.log", 
                       f"Agent validation failed: Found model '{model}', expected '{allowed_model}'.")
             return False
             
-    return True
\ No newline at end of file
+    return True
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    """True for `if __name__ == "__main__":` (either operand order)."""
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    test = node.test
+    if len(test.ops) != 1 or not isinstance(test.ops[0], ast.Eq):
+        return False
+    operands = (test.left, test.comparators[0])
+    for name_side, other_side in (operands, operands[::-1]):
+        if (isinstance(name_side, ast.Name) and name_side.id == '__name__'
+                and isinstance(other_side, ast.Constant) and other_side.value == '__main__'):
+            return True
+    return False
+
+def static_validate(code_string: str) -> tuple[bool, str]:
+    """
+    Cheap pre-load check of generated agent code: it must parse and define a
+    top-level `run_agent` function and an `if __name__ == "__main__":` block.
+    Returns (True, "") or (False, reason).
+    """
+    try:
+        tree = ast.parse(code_string)
+    except SyntaxError as e:
+        return False, f"SyntaxError: {e.msg} (line {e.lineno})"
+
+    has_run_agent = any(
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == 'run_agent'
+        for node in tree.body
+    )
+    if not has_run_agent:
+        return False, "Missing top-level 'def run_agent(question: str) -> str'."
+
+    if not any(_is_main_guard(node) for node in tree.body):
+        return False, "Missing 'if __name__ == \"__main__\":' block."
+
+    return True, ""
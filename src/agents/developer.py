@@ -1,28 +1,37 @@
-from src.logging_utils import client, update_token_stats, log_event
+import os
+import asyncio
+import hashlib
+from src import config
+from src.logging_utils import get_client, new_async_client, update_token_stats, log_event
 from src.agent_utils import clean_generated_code
 
-def call_developer_agent(previous_code: str,
-                         success_examples: list,
-                         failed_examples: list,
-                         current_version_id: str,
-                         task_model: str,
-                         meta_model: str) -> str | None:
-    """
-    Uses the META_MODEL to analyze and improve an existing agent's code.
-    """
+_PY_FENCE = "```python"
+
+# Per-example character limits for the Developer prompt
+MAX_QUESTION_CHARS = 500
+MAX_AGENT_OUTPUT_CHARS = 500
+
+def _format_example(example: dict) -> str:
+    """Formats one example for the Developer report, truncating long fields."""
+    return (
+        f"- Q: {example['question'][:MAX_QUESTION_CHARS]}\n"
+        f"  A (Correct): {example['correct_answer']}\n"
+        f"  A (Agent): {str(example['agent_output'])[:MAX_AGENT_OUTPUT_CHARS]}\n"
+    )
+
+def _build_developer_prompts(previous_code: str,
+                             success_examples: list,
+                             failed_examples: list,
+                             current_version_id: str,
+                             task_model: str) -> tuple[str, str]:
+    """Returns the (system_prompt, user_prompt) pair for a Developer Agent call."""
 
-    failures_report = "\n".join([
-        f"- Q: {f['question']}\n  A (Correct): {f['correct_answer']}\n  A (Agent): {f['agent_output']}\n"
-        for f in failed_examples
-    ])
+    failures_report = "\n".join(_format_example(f) for f in failed_examples)
     
     if not success_examples:
         success_report = "No successful examples were provided for reference."
     else:
-        success_report = "\n".join([
-            f"- Q: {s['question']}\n  A (Correct): {s['correct_answer']}\n  A (Agent): {s['agent_output']}\n"
-            for s in success_examples
-        ])
+        success_report = "\n".join(_format_example(s) for s in success_examples)
 
     system_prompt = f"""
 You are an elite Python programmer specializing in LangGraph agents.
@@ -62,20 +71,196 @@ Successful Examples (for reference): {success_report}
 YOUR TASK
 Generate the complete, raw Python code for the next version that fixes these issues. Remember: YOU MUST MODIFY THE CODE and preserve the run_agent function and if __name__ == '__main__' block. Ensure the agent's internal model is set to model="{task_model}". """
 
-print(f"--- Calling 'Developer Agent' ({meta_model}) to evolve from {current_version_id}... ---")
-try:
-    response = client.chat.completions.create(
-        model=meta_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
+    return system_prompt, user_prompt
+
+class _StreamCollector:
+    """
+    Accumulates a streamed completion: text parts, the final usage chunk, and
+    whether the output opened with a ```python fence (decided from the first chunks).
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.usage_chunk = None
+        self.python_fenced = None
+
+    def feed(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage_chunk = chunk
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.parts.append(chunk.choices[0].delta.content)
+            if self.python_fenced is None:
+                head = "".join(self.parts).lstrip()
+                if len(head) >= len(_PY_FENCE):
+                    self.python_fenced = head.startswith(_PY_FENCE)
+
+    def result(self, meta_model: str) -> str:
+        """Records token usage and extracts the generated code from the collected text."""
+        update_token_stats(self.usage_chunk, meta_model) # Log tokens
+        generated_code = "".join(self.parts)
+        return clean_generated_code(generated_code, python_fenced=bool(self.python_fenced))
+
+def _dev_cache_path(system_prompt: str, user_prompt: str, meta_model: str) -> str | None:
+    """Returns the cache file for this exact prompt, or None if the cache is disabled."""
+    if not config.DEV_CACHE_ENABLED or not config.DEV_CACHE_DIR:
+        return None
+    key = hashlib.sha256((system_prompt + user_prompt + meta_model).encode()).hexdigest()
+    return os.path.join(config.DEV_CACHE_DIR, f"{key}.py")
+
+def _read_dev_cache(cache_path: str | None, current_version_id: str,
+                    system_prompt: str, user_prompt: str, skip_cached=None) -> str | None:
+    """
+    Returns cached code for the prompt (logging the hit), or None on a miss.
+    A hit that `skip_cached(code)` rejects (already in this run's archive, or
+    already rejected in this run) counts as a miss.
+    """
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached_code = f.read()
+    except OSError:
+        return None
+    if skip_cached is not None and skip_cached(cached_code):
+        print(f"--- Developer cache entry for {current_version_id} is already in this run's archive or was rejected. Calling the API. ---")
+        return None
+    print(f"--- Developer cache hit for {current_version_id}. Skipping API call. ---")
+    log_event("dev_cache.log", {
+        "event": "dev_cache_hit",
+        "version_id": current_version_id,
+        "key": os.path.basename(cache_path)[:-len(".py")],
+        # Rough estimate: ~4 characters per token
+        "estimated_prompt_tokens_saved": (len(system_prompt) + len(user_prompt)) // 4,
+        "estimated_completion_tokens_saved": len(cached_code) // 4
+    })
+    return cached_code
+
+def cache_developer_code(request: dict, code: str | None):
+    """
+    Stores `code` as the result for a Developer request (a dict of
+    `call_developer_agent` keyword arguments). Called by the loop only once the
+    child is archived, so rejected generations are never replayed. Entries live in
+    config.DEV_CACHE_DIR and are replayed by later runs.
+    """
+    if not code:
+        return
+    system_prompt, user_prompt = _build_developer_prompts(
+        request['previous_code'], request['success_examples'], request['failed_examples'],
+        request['current_version_id'], request['task_model']
     )
-    update_token_stats(response, meta_model) # Log tokens
-    generated_code = response.choices[0].message.content
-    return clean_generated_code(generated_code)
-    
-except Exception as e:
+    cache_path = _dev_cache_path(system_prompt, user_prompt, request['meta_model'])
+    if cache_path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Runs share the cache directory, so publish each entry atomically
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Failed to write Developer cache entry: {e}")
+
+def _log_developer_failure(current_version_id: str, e: Exception):
+    """Reports a failed Developer Agent API call."""
     print(f"Error calling OpenAI API (Developer Agent): {e}")
     log_event("fatal_errors.log", f"Developer Agent API call for {current_version_id} failed: {e}")
-    return None
\ No newline at end of file
+
+def call_developer_agent(previous_code: str,
+                         success_examples: list,
+                         failed_examples: list,
+                         current_version_id: str,
+                         task_model: str,
+                         meta_model: str,
+                         skip_cached=None) -> str | None:
+    """
+    Uses the META_MODEL to analyze and improve an existing agent's code.
+    `skip_cached(code)` returning True makes a Developer cache hit count as a miss.
+    """
+    system_prompt, user_prompt = _build_developer_prompts(
+        previous_code, success_examples, failed_examples, current_version_id, task_model
+    )
+
+    cache_path = _dev_cache_path(system_prompt, user_prompt, meta_model)
+    cached_code = _read_dev_cache(cache_path, current_version_id, system_prompt, user_prompt, skip_cached)
+    if cached_code is not None:
+        return cached_code
+
+    print(f"--- Calling 'Developer Agent' ({meta_model}) to evolve from {current_version_id}... ---")
+    try:
+        stream = get_client().chat.completions.create(
+            model=meta_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        collector = _StreamCollector()
+        for chunk in stream:
+            collector.feed(chunk)
+        return collector.result(meta_model)
+    
+    except Exception as e:
+        _log_developer_failure(current_version_id, e)
+        return None
+
+async def call_developer_agent_async(previous_code: str,
+                                     success_examples: list,
+                                     failed_examples: list,
+                                     current_version_id: str,
+                                     task_model: str,
+                                     meta_model: str,
+                                     async_client,
+                                     skip_cached=None) -> str | None:
+    """
+    Async variant of `call_developer_agent`, using the given AsyncOpenAI client.
+    """
+    system_prompt, user_prompt = _build_developer_prompts(
+        previous_code, success_examples, failed_examples, current_version_id, task_model
+    )
+
+    cache_path = _dev_cache_path(system_prompt, user_prompt, meta_model)
+    cached_code = _read_dev_cache(cache_path, current_version_id, system_prompt, user_prompt, skip_cached)
+    if cached_code is not None:
+        return cached_code
+
+    print(f"--- Calling 'Developer Agent' ({meta_model}) to evolve from {current_version_id}... ---")
+    try:
+        stream = await async_client.chat.completions.create(
+            model=meta_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        collector = _StreamCollector()
+        async for chunk in stream:
+            collector.feed(chunk)
+        return collector.result(meta_model)
+    
+    except Exception as e:
+        _log_developer_failure(current_version_id, e)
+        return None
+
+def call_developer_agents(requests: list[dict]) -> list[str | None]:
+    """
+    Runs one Developer Agent call per request (each a dict of `call_developer_agent`
+    keyword arguments) and returns the generated codes in request order.
+    Calls run concurrently when there is more than one; a single call takes the sync path.
+    """
+    if len(requests) <= 1:
+        return [call_developer_agent(**request) for request in requests]
+
+    async def _gather():
+        # One client per event loop: httpx connections are bound to the loop that opened them
+        async with new_async_client() as async_client:
+            return await asyncio.gather(*(
+                call_developer_agent_async(**request, async_client=async_client)
+                for request in requests
+            ))
+
+    return list(asyncio.run(_gather()))
@@ -7,101 +7,131 @@ def get_agent_base_template(task_model: str) -> str:
 import os
 import operator
 import sys
-from dotenv import load_dotenv
+import threading
 from typing import TypedDict, Annotated, List
 
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, ToolMessage
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-
 # --- 1. Setup ---
-# Load environment variables (e.g., OPENAI_API_KEY)
-# This is good practice in case the agent is run standalone.
-load_dotenv()
+# Heavy dependencies (LangGraph, LangChain, dotenv) are imported inside
+# _build_app(), so loading this module is cheap. The graph is built on the
+# first run_agent() call and reused afterwards.
+_APP = None
+_APP_ERROR = None
+_APP_LOCK = threading.Lock()
+
+def _build_app():
+    \"\"\"
+    Imports the heavy dependencies and builds the compiled agent graph.
+    \"\"\"
+    from dotenv import load_dotenv
+    from langgraph.graph import StateGraph, END
+    from langgraph.prebuilt import ToolNode
+    from langchain_core.messages import BaseMessage, SystemMessage, AIMessage
+    from langchain_core.tools import tool
+    from langchain_openai import ChatOpenAI
+
+    # Load environment variables (e.g., OPENAI_API_KEY)
+    # This is good practice in case the agent is run standalone.
+    load_dotenv()
+
+    # CRITICAL: This model is set by the evolutionary process.
+    # DO NOT CHANGE THIS LINE.
+    llm = ChatOpenAI(model="{task_model}")
+
+    # --- 2. Tool Definition ---
+    # This section will be replaced by the Creator Agent
+
+    @tool
+    def dummy_tool(input: str) -> str:
+        \"\"\"A dummy tool. Use when the user asks for a 'test'.\"\"\"
+        # This print is for agent debugging, not evolution logging
+        # print(f"\\n--- Executing Tool: dummy_tool('{{input}}') ---") 
+        return "This is a dummy response from the tool."
+
+    tools = [dummy_tool]
+    llm_with_tools = llm.bind_tools(tools)
+    tool_node = ToolNode(tools)
+
+    # --- 3. Graph State Definition ---
+
+    class AgentState(TypedDict):
+        messages: Annotated[List[BaseMessage], operator.add]
+
+    # --- 4. Graph Node Definitions ---
+
+    def agent_node(state):
+        \"\"\"
+        The main agent node. Calls the LLM to decide the next action.
+        \"\"\"
+        # === SYSTEM PROMPT ===
+        # This will be replaced by the Creator/Developer Agent
+        system_prompt = SystemMessage(
+            content="You are a helpful assistant. You have access to a 'dummy_tool'."
+        )
+        # === END SYSTEM PROMPT ===
+
+        messages_for_api = [system_prompt] + state["messages"]
+        
+        # Call the LLM
+        response = llm_with_tools.invoke(messages_for_api)
+        
+        return {{"messages": [response]}}
 
-# CRITICAL: This model is set by the evolutionary process.
-# DO NOT CHANGE THIS LINE.
-llm = ChatOpenAI(model="{task_model}")
+    # --- 5. Conditional Edge Logic ---
 
-# --- 2. Tool Definition ---
-# This section will be replaced by the Creator Agent
+    def should_continue(state):
+        \"\"\"
+        This is the router. It checks the last message from the 'agent_node'.
+        \"\"\"
+        last_message = state["messages"][-1]
 
-@tool
-def dummy_tool(input: str) -> str:
-    \"\"\"A dummy tool. Use when the user asks for a 'test'.\"\"\"
-    # This print is for agent debugging, not evolution logging
-    # print(f"\\n--- Executing Tool: dummy_tool('{{input}}') ---") 
-    return "This is a dummy response from the tool."
+        # If the LLM response contains tool calls, route to 'call_tool'
+        if isinstance(last_message, AIMessage) and last_message.tool_calls:
+            return "call_tool"
+        
+        # Otherwise, the conversation is over
+        return END
 
-tools = [dummy_tool]
-llm_with_tools = llm.bind_tools(tools)
-tool_node = ToolNode(tools)
+    # --- 6. Graph Construction & Compilation ---
 
-# --- 3. Graph State Definition ---
+    workflow = StateGraph(AgentState)
 
-class AgentState(TypedDict):
-    messages: Annotated[List[BaseMessage], operator.add]
+    # Add the nodes
+    workflow.add_node("agent", agent_node)
+    workflow.add_node("call_tool", tool_node)
 
-# --- 4. Graph Node Definitions ---
+    # Set the entry point
+    workflow.set_entry_point("agent")
 
-def agent_node(state):
-    \"\"\"
-    The main agent node. Calls the LLM to decide the next action.
-    \"\"\"
-    # === SYSTEM PROMPT ===
-    # This will be replaced by the Creator/Developer Agent
-    system_prompt = SystemMessage(
-        content="You are a helpful assistant. You have access to a 'dummy_tool'."
+    # Add the conditional edges
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {{"call_tool": "call_tool", END: END}}
     )
-    # === END SYSTEM PROMPT ===
 
-    messages_for_api = [system_prompt] + state["messages"]
-    
-    # Call the LLM
-    response = llm_with_tools.invoke(messages_for_api)
-    
-    return {{"messages": [response]}}
+    # Add the edge from tool use back to the agent
+    workflow.add_edge("call_tool", "agent")
 
-# --- 5. Conditional Edge Logic ---
+    # Compile the graph
+    return workflow.compile()
 
-def should_continue(state):
+def _get_app():
     \"\"\"
-    This is the router. It checks the last message from the 'agent_node'.
+    Returns the compiled graph, building it on first use (thread-safe).
+    A failed build is remembered and re-raised instead of being retried per question.
     \"\"\"
-    last_message = state["messages"][-1]
-
-    # If the LLM response contains tool calls, route to 'call_tool'
-    if isinstance(last_message, AIMessage) and last_message.tool_calls:
-        return "call_tool"
-    
-    # Otherwise, the conversation is over
-    return END
-
-# --- 6. Graph Construction & Compilation ---
-
-workflow = StateGraph(AgentState)
-
-# Add the nodes
-workflow.add_node("agent", agent_node)
-workflow.add_node("call_tool", tool_node)
-
-# Set the entry point
-workflow.set_entry_point("agent")
-
-# Add the conditional edges
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {{"call_tool": "call_tool", END: END}}
-)
-
-# Add the edge from tool use back to the agent
-workflow.add_edge("call_tool", "agent")
-
-# Compile the graph
-app = workflow.compile()
+    global _APP, _APP_ERROR
+    if _APP is None:
+        with _APP_LOCK:
+            if _APP is None:
+                if _APP_ERROR is not None:
+                    raise _APP_ERROR
+                try:
+                    _APP = _build_app()
+                except Exception as e:
+                    _APP_ERROR = e
+                    raise
+    return _APP
 
 # --- 7. Execution Function (for importability) ---
 
@@ -110,10 +140,14 @@ def run_agent(question: str) -> str:
     Executes the agent for a single question and returns the final answer.
     This function is required by the DGM evaluation loop.
     \"\"\"
-    inputs = {{"messages": [HumanMessage(content=question)]}}
     final_response_content = "(No response from agent)"
     
     try:
+        from langchain_core.messages import HumanMessage, AIMessage
+
+        app = _get_app()
+        inputs = {{"messages": [HumanMessage(content=question)]}}
+
         # Use app.stream with a recursion limit for safety
         for event in app.stream(inputs, {{"recursion_limit": 10}}):
             if "agent" in event:
@@ -123,7 +157,8 @@ def run_agent(question: str) -> str:
                     final_response_content = last_message.content
                     
     except Exception as e:
-        # Agent-level errors are caught and returned as a string
+        # Agent-level errors (including failures to build the graph) are
+        # caught and returned as a string.
         # This prevents the whole evolution loop from crashing
         return f"Runtime Error: {{str(e)}}"
     
@@ -19,6 +19,24 @@ DEFAULT_ITERATIONS_T = 10           # T iterations of DGM
 BASE_LAMBDA_PRODUCT = 300.0
 DEFAULT_SIGMOID_ALPHA0 = 0.5        # α0 (alpha_0)
 
+# --- Evaluation Configuration ---
+EVAL_CONCURRENCY = 16               # Worker threads per evaluation (agent calls are I/O-bound)
+MAX_CONCURRENT_AGENT_CALLS = 16     # Global cap on in-flight agent calls (OpenAI rate limit)
+FAILURE_SEARCH_OVERSAMPLE = 2       # Failure search probes max_failures * this samples per chunk
+FAILURE_SEARCH_BUDGET_FACTOR = 20   # Failure search tries at most max_failures * this samples
+EVAL_WORKERS = EVAL_CONCURRENCY     # Agent worker processes, one call each (0 = run agents in-process)
+EVAL_WORKER_TIMEOUT_S = 300         # Max seconds one answer may run in a worker (queue time excluded)
+
+# Two-stage validation: children are scored on a fixed prefix first and only
+# get the full validation run if they don't clearly trail their parent.
+VALIDATION_PREFIX_SIZE = 5
+VALIDATION_PREFIX_KILL_MARGIN = 0.2 # Skip full eval if prefix < parent prefix - margin
+PARTIAL_SCORE_PENALTY = 0.25        # Archived score = prefix score * (1 - penalty)
+
+# --- Developer Agent Configuration ---
+DEV_CACHE_ENABLED = True            # Reuse generated code for identical Developer prompts (--no_dev_cache disables)
+DEV_CACHE_DIR = os.path.join("evolution_logs", "dev_cache") # Shared by all runs (each run gets a new LOG_FOLDER)
+
 # --- Project & Dataset Configuration ---
 DEFAULT_DATASET = "openai/gsm8k"
 STARTING_AGENT_FILENAME = "math_agent_v0.py"
@@ -1,4 +1,5 @@
 from datasets import load_dataset, DatasetDict
+from src.agent_utils import extract_final_answer
 
 def get_prepared_dataset(dataset_name: str) -> DatasetDict | None:
     """
@@ -40,4 +41,20 @@ def get_prepared_dataset(dataset_name: str) -> DatasetDict | None:
         
     except Exception as e:
         print(f"Error loading or partitioning dataset {dataset_name}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def prepare_eval_views(dataset: DatasetDict) -> dict:
+    """
+    Precomputes, per split, a list of (question, answer, final_answer) tuples.
+    The ground-truth final answer is extracted once here instead of on every
+    evaluation of every agent.
+    """
+    views = {}
+    for split, data in dataset.items():
+        # One Arrow -> Python conversion per split, instead of a row dict per sample
+        columns = data.to_dict()
+        views[split] = [
+            (question, answer, extract_final_answer(answer))
+            for question, answer in zip(columns['question'], columns['answer'])
+        ]
+    return views
\ No newline at end of file
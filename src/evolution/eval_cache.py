@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import datetime
+import threading
+from src import config
+
+class RunCache:
+    """
+    Content-addressable on-disk cache of agent answers.
+    Keyed by sha256(agent_code || question || task_model), so an unchanged
+    agent re-asked the same question never pays for a second LLM call.
+    """
+
+    def __init__(self, agent_path: str, task_model: str, cache_dir: str | None = None):
+        self.cache_dir = cache_dir or os.path.join(config.LOG_FOLDER, "eval_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(agent_path, 'rb') as f:
+            self.agent_code = f.read()
+        self.task_model = task_model
+
+    def _key(self, question: str) -> str:
+        return hashlib.sha256(
+            self.agent_code + b'\x00' + question.encode() + b'\x00' + self.task_model.encode()
+        ).hexdigest()
+
+    def _entry_path(self, question: str) -> str:
+        return os.path.join(self.cache_dir, f"{self._key(question)}.json")
+
+    def get(self, question: str) -> str | None:
+        """Returns the cached answer for `question`, or None on a miss."""
+        try:
+            with open(self._entry_path(question), 'r', encoding='utf-8') as f:
+                return json.load(f)["answer"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, question: str, answer: str):
+        """Stores `answer`. Runtime errors are not cached so they can be retried."""
+        answer = str(answer)
+        if answer.startswith("Runtime Error:"):
+            return
+        entry_path = self._entry_path(question)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"answer": answer, "ts": datetime.datetime.now().isoformat()}, f)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"  [Cache] Warning: Failed to write cache entry: {e}")
+
+    def wrap(self, agent_runner):
+        """Returns a drop-in replacement for `agent_runner` that reads/writes the cache."""
+        def cached_runner(question: str) -> str:
+            answer = self.get(question)
+            if answer is not None:
+                return answer
+            answer = agent_runner(question)
+            self.put(question, answer)
+            return answer
+        return cached_runner
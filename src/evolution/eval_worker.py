@@ -0,0 +1,120 @@
+import os
+import threading
+import multiprocessing
+import multiprocessing.util
+import traceback
+from src import config
+
+def _init_worker(log_folder: str, agent_folder: str | None):
+    """Runs once in each worker process."""
+    from src.logging_utils import flush_logs
+    from src.agent_utils import ensure_agent_dir_on_path
+
+    config.LOG_FOLDER = log_folder
+    # Spawned workers start from a fresh sys.path, not the parent's
+    if agent_folder:
+        ensure_agent_dir_on_path(agent_folder)
+    # Pool workers exit without running atexit hooks; multiprocessing finalizers do run
+    multiprocessing.util.Finalize(None, flush_logs, exitpriority=10)
+
+def _run_agent_in_worker(agent_path: str, question: str) -> tuple[str | None, str | None]:
+    """
+    Runs one question through the agent at `agent_path` inside a worker process.
+    The module is imported on the worker's first question for that file and then
+    reused (load_agent_from_file caches by path and mtime).
+    Returns (answer, None) or (None, error).
+    """
+    from src.agent_utils import load_agent_from_file
+
+    module_name = os.path.splitext(os.path.basename(agent_path))[0]
+    agent_module = load_agent_from_file(agent_path, module_name)
+    if agent_module is None or not hasattr(agent_module, 'run_agent'):
+        return None, f"Agent {agent_path} could not be loaded in eval worker {os.getpid()}."
+    try:
+        return agent_module.run_agent(question), None
+    except Exception as e:
+        # Agent exceptions may not be picklable, so only their text crosses back
+        return None, ''.join(traceback.format_exception_only(type(e), e)).strip()
+
+def _check_agent_in_worker(agent_path: str) -> tuple[bool, str]:
+    """
+    Runs the load-time functional check (`check_agent_functional`) for the agent
+    at `agent_path` inside a worker process. Returns (is_functional, reason).
+    """
+    from src.agent_utils import load_agent_from_file, check_agent_functional
+
+    module_name = os.path.splitext(os.path.basename(agent_path))[0]
+    try:
+        agent_module = load_agent_from_file(agent_path, module_name)
+    except BaseException as e:
+        # e.g. sys.exit() at import time: report it instead of letting the worker die
+        return False, f"Module failed to load: {''.join(traceback.format_exception_only(type(e), e)).strip()}"
+    return check_agent_functional(agent_module)
+
+class EvalWorkerPool:
+    """
+    Long-lived worker processes that run agents out of the main interpreter.
+    Each worker imports an agent once and serves all of its questions, and a
+    crash inside an agent is contained to the worker. A worker runs one call at
+    a time, so callers beyond `num_workers` wait on a slot instead of queueing in
+    the pool; the timeout then only covers a call's own run time.
+    """
+
+    def __init__(self, num_workers: int, agent_folder: str | None = None):
+        # 'spawn' avoids forking a parent that already runs threads and HTTP clients
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=num_workers,
+            initializer=_init_worker,
+            initargs=(config.LOG_FOLDER, agent_folder)
+        )
+        self._slots = threading.BoundedSemaphore(num_workers)
+
+    def _call(self, func, args: tuple):
+        """Runs `func(*args)` in a free worker and returns its result (raises on timeout)."""
+        self._slots.acquire()
+        release = lambda _: self._slots.release()
+        try:
+            # The slot is freed when the task really finishes, not when the caller
+            # gives up, so a hung worker keeps holding it
+            result = self._pool.apply_async(func, args, callback=release, error_callback=release)
+        except BaseException:
+            self._slots.release()
+            raise
+        return result.get(timeout=config.EVAL_WORKER_TIMEOUT_S)
+
+    def runner(self, agent_path: str):
+        """
+        Returns a `run_agent`-compatible callable that executes in the pool.
+        Safe to call from multiple threads; each call blocks until its answer is ready.
+        """
+        abs_path = os.path.abspath(agent_path)
+
+        def run_in_pool(question: str) -> str:
+            # The timeout keeps a crashed worker (whose result never arrives) from hanging the caller
+            answer, error = self._call(_run_agent_in_worker, (abs_path, question))
+            if error is not None:
+                raise RuntimeError(error)
+            return answer
+        return run_in_pool
+
+    def check_agent(self, agent_path: str) -> tuple[bool, str]:
+        """
+        Imports the agent in a worker (never in the calling process) and runs the
+        functional check there. Returns (is_functional, reason).
+        """
+        try:
+            return self._call(_check_agent_in_worker, (os.path.abspath(agent_path),))
+        except multiprocessing.TimeoutError:
+            return False, f"Functional check timed out after {config.EVAL_WORKER_TIMEOUT_S}s (worker crashed or hung)."
+        except Exception as e:
+            return False, f"Functional check failed in eval worker: {e}"
+
+    def close(self):
+        """
+        Stops the workers. Nothing is needed from the pool afterwards, so they are
+        terminated rather than drained: close() + join() would wait forever on a
+        task that already timed out because its agent hung.
+        """
+        self._pool.terminate()
+        self._pool.join()
@@ -1,91 +1,159 @@
-python
 import numpy as np
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src import config
 from src.agent_utils import extract_final_answer
+from src.evolution.eval_cache import RunCache
 
-def evaluate_agent_on_dataset(agent_module, dataset):
+# Caps in-flight agent calls across all evaluations (OpenAI rate limit)
+_API_SEMAPHORE = threading.Semaphore(config.MAX_CONCURRENT_AGENT_CALLS)
+
+def _get_agent_runner(agent_module, agent_path: str | None, task_model: str | None, pool=None):
+    """
+    Returns the agent's `run_agent` (executed in `pool` when one is given),
+    wrapped in a RunCache when the agent's source path and task model are known.
+    """
+    if pool is not None and agent_path is not None:
+        agent_runner = pool.runner(agent_path)
+    else:
+        agent_runner = agent_module.run_agent
+    if agent_path is None or task_model is None:
+        return agent_runner
+    try:
+        return RunCache(agent_path, task_model).wrap(agent_runner)
+    except OSError as e:
+        print(f"  [Cache] Warning: Evaluation cache disabled for {agent_path}: {e}")
+        return agent_runner
+
+def _is_runnable(agent_module, agent_path: str | None, pool) -> bool:
+    """True if the agent can be run: in `pool` by path, or in-process via its module."""
+    if pool is not None and agent_path is not None:
+        return True
+    return agent_module is not None and hasattr(agent_module, 'run_agent')
+
+def _run_guarded(agent_runner, question: str) -> tuple[str | None, str | None]:
+    """
+    Runs the agent on one question under the API semaphore.
+    Returns (answer, None) or (None, error) if the agent raised.
+    Only the exception line is kept; full tracebacks bloat the Developer prompt.
+    """
+    with _API_SEMAPHORE:
+        try:
+            return agent_runner(question), None
+        except Exception as e:
+            return None, ''.join(traceback.format_exception_only(type(e), e))
+
+def evaluate_agent_on_dataset(agent_module, dataset, agent_path: str | None = None, task_model: str | None = None,
+                              pool=None):
     """
     Evaluates an agent on a dataset (validation or test) and returns its accuracy score.
+    `dataset` is an eval view from `prepare_eval_views`.
     Returns 0.0 if the agent is not functional.
+    Answers are cached on disk when `agent_path` and `task_model` are given.
+    With an EvalWorkerPool (and `agent_path`), the agent runs in the worker processes
+    and `agent_module` may be None.
     """
-    if agent_module is None or not hasattr(agent_module, 'run_agent'):
+    if not _is_runnable(agent_module, agent_path, pool):
         print(f"  [Evaluation] Agent module is not functional. Score: 0.0")
         return 0.0
 
-    agent_runner = agent_module.run_agent
+    agent_runner = _get_agent_runner(agent_module, agent_path, task_model, pool)
     success_count = 0
     total_count = len(dataset)
     if total_count == 0:
         return 0.0
 
     print(f"  [Evaluation] Running evaluation on {total_count} samples...")
-    for sample in dataset:
-        try:
-            question = sample['question']
-            correct_answer_raw = sample['answer']
-            correct_answer_final = extract_final_answer(correct_answer_raw)
+    questions = [question for question, _, _ in dataset]
+    correct_answers = [correct_answer_final for _, _, correct_answer_final in dataset]
 
-            agent_answer_raw = agent_runner(question)
-            agent_answer_final = extract_final_answer(agent_answer_raw)
+    with ThreadPoolExecutor(max_workers=config.EVAL_CONCURRENCY) as executor:
+        results = list(executor.map(lambda q: _run_guarded(agent_runner, q), questions))
 
-            if agent_answer_final == correct_answer_final and correct_answer_final != "":
-                success_count += 1
-        except Exception as e:
+    for (agent_answer_raw, error), correct_answer_final in zip(results, correct_answers):
+        if error is not None:
             # This should not happen if run_agent() catches its own errors
-            print(f"  [Evaluation] Critical runtime error during evaluation: {e}")
-            pass
+            print(f"  [Evaluation] Critical runtime error during evaluation: {error.strip().splitlines()[-1]}")
+            continue
+
+        agent_answer_final = extract_final_answer(agent_answer_raw)
+        if agent_answer_final == correct_answer_final and correct_answer_final != "":
+            success_count += 1
     
     accuracy = success_count / total_count
     print(f"  [Evaluation] Complete. Score: {accuracy:.4f} ({success_count}/{total_count})")
     return accuracy
 
-def find_failures_on_train(agent_module, train_dataset, max_failures: int):
+def find_failures_on_train(agent_module, train_dataset, max_failures: int,
+                           agent_path: str | None = None, task_model: str | None = None, pool=None):
     """
     Runs the agent on the training set until `max_failures` errors are found.
+    `train_dataset` is an eval view from `prepare_eval_views`.
+    Answers are cached on disk when `agent_path` and `task_model` are given.
+    With an EvalWorkerPool (and `agent_path`), the agent runs in the worker processes
+    and `agent_module` may be None.
     """
     failures = []
     successes = []
     
-    if agent_module is None or not hasattr(agent_module, 'run_agent'):
+    if not _is_runnable(agent_module, agent_path, pool):
         print(f"  [Train] Agent module is not functional. Cannot find failures.")
         return [], []
 
-    agent_runner = agent_module.run_agent
+    agent_runner = _get_agent_runner(agent_module, agent_path, task_model, pool)
 
     print(f"  [Train] Searching for up to {max_failures} failures in training set...")
-    # Shuffle dataset for random sampling of failures
-    for sample in train_dataset.shuffle(seed=np.random.randint(10000)):
-        if len(failures) >= max_failures:
-            print(f"  [Train] Failure limit of {max_failures} reached.")
-            break
+    # Random sample (without replacement) of at most `budget` training samples
+    budget = max_failures * config.FAILURE_SEARCH_BUDGET_FACTOR
+    n = len(train_dataset)
+    order = np.random.choice(n, size=min(n, budget), replace=False)
+    # Probe in parallel chunks; over-work is bounded to one chunk
+    chunk_size = max(1, max_failures * config.FAILURE_SEARCH_OVERSAMPLE)
 
-        question = sample['question']
-        correct_answer_raw = sample['answer']
-        correct_answer_final = extract_final_answer(correct_answer_raw)
+    with ThreadPoolExecutor(max_workers=config.EVAL_CONCURRENCY) as executor:
+        for start in range(0, len(order), chunk_size):
+            futures = {
+                executor.submit(_run_guarded, agent_runner, train_dataset[i][0]): train_dataset[i]
+                for i in order[start:start + chunk_size]
+            }
+
+            for future in as_completed(futures):
+                question, correct_answer_raw, correct_answer_final = futures[future]
+                agent_answer_raw, error = future.result()
+
+                if error is not None:
+                    # This should be caught by run_agent, but as a fallback
+                    failures.append({
+                        "question": question,
+                        "correct_answer": correct_answer_raw,
+                        "agent_output": f"Runtime Error: {error}"
+                    })
+                else:
+                    agent_answer_final = extract_final_answer(agent_answer_raw)
+
+                    if agent_answer_final == correct_answer_final and correct_answer_final != "":
+                        successes.append({
+                            "question": question,
+                            "correct_answer": correct_answer_raw,
+                            "agent_output": agent_answer_raw
+                        })
+                    else:
+                        failures.append({
+                            "question": question,
+                            "correct_answer": correct_answer_raw,
+                            "agent_output": f"Wrong Answer: {agent_answer_raw}"
+                        })
+
+                if len(failures) >= max_failures:
+                    break
+
+            if len(failures) >= max_failures:
+                print(f"  [Train] Failure limit of {max_failures} reached.")
+                # Drop the chunk's runs that have not started yet
+                for future in futures:
+                    future.cancel()
+                break
 
-        try:
-            agent_answer_raw = agent_runner(question)
-            agent_answer_final = extract_final_answer(agent_answer_raw)
-
-            if agent_answer_final == correct_answer_final and correct_answer_final != "":
-                successes.append({
-                    "question": question,
-                    "correct_answer": correct_answer_raw,
-                    "agent_output": agent_answer_raw
-                })
-            else:
-                failures.append({
-                    "question": question,
-                    "correct_answer": correct_answer_raw,
-                    "agent_output": f"Wrong Answer: {agent_answer_raw}"
-                })
-        except Exception as e:
-            # This should be caught by run_agent, but as a fallback
-            failures.append({
-                "question": question,
-                "correct_answer": correct_answer_raw,
-                "agent_output": f"Runtime Error: {traceback.format_exc()}"
-            })
-    
     print(f"  [Train] Search complete. Found {len(failures)} failures, {len(successes)} successes.")
     return failures, successes
\ No newline at end of file
@@ -1,10 +1,20 @@
 import os
-import math
+import hashlib
 import numpy as np
+from src import config
 from src.logging_utils import log_event
-from src.agent_utils import load_agent_from_file, validate_agent_model_usage, save_agent_code
-from src.agents.developer import call_developer_agent
+from src.agent_utils import (load_agent_from_file, validate_agent_model_usage, save_agent_code, static_validate,
+                             check_agent_functional)
+from src.agents.developer import call_developer_agents, cache_developer_code
 from src.evolution.evaluation import evaluate_agent_on_dataset, find_failures_on_train
+from src.evolution.eval_worker import EvalWorkerPool
+
+# Archive fields kept in memory for the loop but left out of the logs
+_ARCHIVE_MEMORY_ONLY_KEYS = ('code', 'code_hash')
+
+def _code_hash(code: str) -> bytes:
+    """Digest used for duplicate detection (whitespace-insensitive at the ends, like strip())."""
+    return hashlib.sha256(code.strip().encode()).digest()
 
 def select_parents(archive: list, k: int, sigmoid_lambda: float, sigmoid_alpha0: float) -> list:
     """
@@ -19,37 +29,82 @@ def select_parents(archive: list, k: int, sigmoid_lambda: float, sigmoid_alpha0:
         print("  [Selection] All agents are perfect. Selecting randomly from archive.")
         eligible_set = archive
 
-    weights, agents_in_set = [], []
-    for agent in eligible_set:
-        alpha_i = agent['score']
-        n_i = agent['children_count']
-        
-        # s_i: Score-based fitness (Sigmoid function)
-        s_i = 1 / (1 + math.exp(-sigmoid_lambda * (alpha_i - sigmoid_alpha0)))
-        
-        # h_i: Novelty/History-based fitness (Discourage child-heavy parents)
-        h_i = 1 / (1 + n_i)
-        
-        # Final weight
-        w_i = s_i * h_i
-        
-        weights.append(w_i)
-        agents_in_set.append(agent)
+    alpha = np.fromiter((agent['score'] for agent in eligible_set), dtype=np.float64, count=len(eligible_set))
+    n = np.fromiter((agent['children_count'] for agent in eligible_set), dtype=np.int32, count=len(eligible_set))
+
+    # s_i: Score-based fitness (Sigmoid function)
+    s = 1.0 / (1.0 + np.exp(-sigmoid_lambda * (alpha - sigmoid_alpha0)))
+    
+    # h_i: Novelty/History-based fitness (Discourage child-heavy parents)
+    h = 1.0 / (1.0 + n)
+    
+    # Final weight
+    weights = s * h
 
-    total_weight = np.sum(weights)
+    total_weight = weights.sum()
     if total_weight == 0:
         # All agents have zero weight, select uniformly
-        probabilities = np.ones(len(agents_in_set)) / len(agents_in_set)
+        probabilities = np.full(len(eligible_set), 1.0 / len(eligible_set))
     else:
-        probabilities = np.array(weights) / total_weight
+        probabilities = weights / total_weight
 
-    selected_parents = np.random.choice(
-        a=agents_in_set, 
+    # Sample indices rather than the dicts themselves (avoids an object array)
+    selected_indices = np.random.choice(
+        len(eligible_set), 
         size=k, 
         replace=True, # DGM uses sampling with replacement
         p=probabilities
     )
-    return list(selected_parents)
+    return [eligible_set[i] for i in selected_indices]
+
+
+def _archive_log_record(agent: dict) -> dict:
+    """Returns the archive entry without its in-memory-only fields (e.g. source code)."""
+    return {key: value for key, value in agent.items() if key not in _ARCHIVE_MEMORY_ONLY_KEYS}
+
+
+def evaluate_on_validation(agent_module, validation_data: list, agent_path: str, task_model: str,
+                           parent_prefix_score: float | None = None, pool=None) -> dict:
+    """
+    Two-stage validation scoring.
+    Runs a deterministic prefix of the validation set first; if the agent trails
+    `parent_prefix_score` by more than the kill margin, the remaining samples are
+    skipped and a penalized prefix score is returned with `partial=True`.
+    """
+    prefix_data = validation_data[:config.VALIDATION_PREFIX_SIZE]
+    rest_data = validation_data[config.VALIDATION_PREFIX_SIZE:]
+
+    prefix_score = evaluate_agent_on_dataset(agent_module, prefix_data, agent_path, task_model, pool)
+
+    if parent_prefix_score is not None and prefix_score < parent_prefix_score - config.VALIDATION_PREFIX_KILL_MARGIN:
+        print(f"    Prefix score {prefix_score:.4f} trails parent ({parent_prefix_score:.4f}). Skipping full validation.")
+        return {
+            'score': prefix_score * (1 - config.PARTIAL_SCORE_PENALTY),
+            'prefix_score': prefix_score,
+            'partial': True
+        }
+
+    if not rest_data:
+        return {'score': prefix_score, 'prefix_score': prefix_score, 'partial': False}
+
+    rest_score = evaluate_agent_on_dataset(agent_module, rest_data, agent_path, task_model, pool)
+    score = (prefix_score * len(prefix_data) + rest_score * len(rest_data)) / len(validation_data)
+    return {'score': score, 'prefix_score': prefix_score, 'partial': False}
+
+
+def _load_checked_agent(agent_path: str, agent_id: str, pool=None):
+    """
+    Runs the load-time functional check for the agent at `agent_path`.
+    With an EvalWorkerPool the agent is imported only in a worker, so a crash or
+    sys.exit() at import cannot take down the loop; the module is then None and
+    the agent runs in the pool. Returns (module, is_functional, reason).
+    """
+    if pool is not None:
+        is_functional, reason = pool.check_agent(agent_path)
+        return None, is_functional, reason
+    agent_module = load_agent_from_file(agent_path, agent_id)
+    is_functional, reason = check_agent_functional(agent_module)
+    return agent_module, is_functional, reason
 
 
 def run_dgm_loop(dataset, 
@@ -61,6 +116,7 @@ def run_dgm_loop(dataset,
                  dgm_params: dict) -> dict | None:
     """
     Executes the full DGM (Deep Genetic Manager) evolution loop.
+    `dataset` holds the eval views from `prepare_eval_views`.
     """
     print("=" * 52)
     print("STARTING DGM (Deep Genetic Manager) EVOLUTION LOOP")
@@ -72,146 +128,197 @@ def run_dgm_loop(dataset,
     agent_version_counter = 0
     archive = [] # Archive A
 
-    # 1. Initialize A <- {g0}
-    print(f"--- Initializing Base Agent v0 ---")
-    module_name_v0 = f"math_agent_v{agent_version_counter}"
-    agent_module_v0 = load_agent_from_file(start_agent_path, module_name_v0)
+    # Agents run in long-lived worker processes unless EVAL_WORKERS is 0
+    eval_pool = EvalWorkerPool(config.EVAL_WORKERS, agent_folder) if config.EVAL_WORKERS > 0 else None
+    try:
+        # 1. Initialize A <- {g0}
+        print(f"--- Initializing Base Agent v0 ---")
+        module_name_v0 = f"math_agent_v{agent_version_counter}"
+        agent_module_v0, is_functional, reason = _load_checked_agent(start_agent_path, module_name_v0, eval_pool)
     
-    if agent_module_v0 is None or not hasattr(agent_module_v0, 'run_agent'):
-        print("FATAL ERROR: Base agent v0 could not be loaded. Aborting.")
-        return None
+        if not is_functional:
+            print(f"FATAL ERROR: Base agent v0 is not functional ({reason}). Aborting.")
+            return None
 
-    initial_score = evaluate_agent_on_dataset(agent_module_v0, validation_data)
+        initial_eval = evaluate_on_validation(agent_module_v0, validation_data, start_agent_path, task_model,
+                                              pool=eval_pool)
+        initial_score = initial_eval['score']
     
-    g0 = {
-        'id': f"v{agent_version_counter}",
-        'path': start_agent_path,
-        'score': initial_score,
-        'children_count': 0,
-        'parent_id': None
-    }
-    archive.append(g0)
-    log_event("archive.log", g0)
-    print(f"Base agent v0 initialized. Validation Score: {initial_score:.4f}")
-
-    # 2. Start DGM loop
-    for t in range(num_iterations):
-        print(f"\n--- DGM Iteration {t+1} / {num_iterations} ---")
+        g0 = {
+            'id': f"v{agent_version_counter}",
+            'path': start_agent_path,
+            'score': initial_score,
+            'prefix_score': initial_eval['prefix_score'],
+            'partial': initial_eval['partial'],
+            'children_count': 0,
+            'parent_id': None
+        }
+        with open(start_agent_path, 'r', encoding='utf-8') as f:
+            g0['code'] = f.read()
+        g0['code_hash'] = _code_hash(g0['code'])
+        archive.append(g0)
+        archive_code_hashes = {g0['code_hash']} # Every agent ever added to A
+        rejected_code_hashes = set() # Children that failed validation or loading
+
+        def _skip_cached_code(code: str) -> bool:
+            # A Developer cache hit can only be replayed if it could still become a new child
+            code_hash = _code_hash(code)
+            return code_hash in archive_code_hashes or code_hash in rejected_code_hashes
+        log_event("archive.log", _archive_log_record(g0))
+        print(f"Base agent v0 initialized. Validation Score: {initial_score:.4f}")
+
+        # 2. Start DGM loop
+        for t in range(num_iterations):
+            print(f"\n--- DGM Iteration {t+1} / {num_iterations} ---")
         
-        # P <- SelectParents(A)
-        parents = select_parents(
-            archive, 
-            dgm_params['num_parents_to_select_k'],
-            dgm_params['sigmoid_lambda'],
-            dgm_params['sigmoid_alpha0']
-        )
+            # P <- SelectParents(A)
+            parents = select_parents(
+                archive, 
+                dgm_params['num_parents_to_select_k'],
+                dgm_params['sigmoid_lambda'],
+                dgm_params['sigmoid_alpha0']
+            )
         
-        if not parents:
-            print("No parents could be selected. Ending evolution.")
-            break
+            if not parents:
+                print("No parents could be selected. Ending evolution.")
+                break
             
-        parent_ids = [p['id'] for p in parents]
-        print(f"  [Selection] Selected parents: {parent_ids}")
-        log_event("evolution.log", f"Iteration {t+1}: Selected parents {parent_ids}")
+            parent_ids = [p['id'] for p in parents]
+            print(f"  [Selection] Selected parents: {parent_ids}")
+            log_event("evolution.log", f"Iteration {t+1}: Selected parents {parent_ids}")
 
-        # foreach p ∈ P
-        for parent_agent in parents:
-            print(f"\n  --- Processing Parent: {parent_agent['id']} (Score: {parent_agent['score']:.4f}) ---")
+            # foreach p ∈ P: find failures (prep pass, before any Developer call)
+            jobs = []
+            for parent_agent in parents:
+                print(f"\n  --- Processing Parent: {parent_agent['id']} (Score: {parent_agent['score']:.4f}) ---")
             
-            parent_module = load_agent_from_file(parent_agent['path'], parent_agent['id'])
-            if parent_module is None:
-                print(f"    ERROR: Could not load parent module {parent_agent['id']}. Skipping.")
-                continue
+                parent_module = None # With a pool, the parent only runs in the workers
+                if eval_pool is None:
+                    parent_module = load_agent_from_file(parent_agent['path'], parent_agent['id'])
+                    if parent_module is None:
+                        print(f"    ERROR: Could not load parent module {parent_agent['id']}. Skipping.")
+                        continue
             
-            failures, successes = find_failures_on_train(
-                parent_module, 
-                train_data, 
-                dgm_params['max_failures_per_child']
-            )
+                failures, successes = find_failures_on_train(
+                    parent_module, 
+                    train_data, 
+                    dgm_params['max_failures_per_child'],
+                    agent_path=parent_agent['path'],
+                    task_model=task_model,
+                    pool=eval_pool
+                )
 
-            if not failures:
-                print(f"    Parent {parent_agent['id']} had no failures on training set. Will not generate child.")
-                continue
-            
-            success_examples_to_send = successes[:dgm_params['num_successes_to_send']]
-            print(f"    Sending {len(failures)} failures and {len(success_examples_to_send)} successes to Developer.")
+                if not failures:
+                    print(f"    Parent {parent_agent['id']} had no failures on training set. Will not generate child.")
+                    continue
             
-            try:
-                with open(parent_agent['path'], 'r', encoding='utf-8') as f:
-                    parent_code = f.read()
-            except FileNotFoundError:
-                print(f"    ERROR: Could not read parent code {parent_agent['id']}. Skipping.")
-                continue
-
-            # c <- p.modify(p)
-            new_code = call_developer_agent(
-                previous_code=parent_code,
-                success_examples=success_examples_to_send,
-                failed_examples=failures,
-                current_version_id=parent_agent['id'],
-                task_model=task_model,
-                meta_model=meta_model
-            )
+                success_examples_to_send = successes[:dgm_params['num_successes_to_send']]
+                print(f"    Sending {len(failures)} failures and {len(success_examples_to_send)} successes to Developer.")
+                jobs.append((parent_agent, failures, success_examples_to_send))
+
+            # c <- p.modify(p), with all of this iteration's Developer calls in flight at once
+            developer_requests = [
+                {
+                    "previous_code": parent_agent['code'],
+                    "success_examples": success_examples_to_send,
+                    "failed_examples": failures,
+                    "current_version_id": parent_agent['id'],
+                    "task_model": task_model,
+                    "meta_model": meta_model,
+                    "skip_cached": _skip_cached_code
+                }
+                for parent_agent, failures, success_examples_to_send in jobs
+            ]
+            generated_codes = call_developer_agents(developer_requests)
 
-            if not new_code:
-                print("    Developer Agent failed to produce code. Child discarded.")
-                log_event("invalid_agents.log", f"Child of {parent_agent['id']} failed generation (no code).")
-                continue
+            for (parent_agent, failures, success_examples_to_send), developer_request, new_code in zip(
+                    jobs, developer_requests, generated_codes):
+                if not new_code:
+                    print(f"    Developer Agent failed to produce code for {parent_agent['id']}. Child discarded.")
+                    log_event("invalid_agents.log", f"Child of {parent_agent['id']} failed generation (no code).")
+                    continue
 
-            agent_version_counter += 1
-            child_id = f"v{agent_version_counter}"
+                agent_version_counter += 1
+                child_id = f"v{agent_version_counter}"
             
-            # --- VALIDATION 1: Duplicate Check ---
-            if new_code.strip() == parent_code.strip():
-                print(f"    Child {child_id} is identical to parent. Discarding.")
-                log_event("invalid_agents.log", f"Child {child_id} was identical to parent {parent_agent['id']}.")
-                continue
+                # --- VALIDATION 1: Duplicate Check ---
+                new_code_hash = _code_hash(new_code)
+                if new_code_hash == parent_agent['code_hash']:
+                    print(f"    Child {child_id} is identical to parent. Discarding.")
+                    log_event("invalid_agents.log", f"Child {child_id} was identical to parent {parent_agent['id']}.")
+                    continue
+                if new_code_hash in archive_code_hashes:
+                    print(f"    Child {child_id} is identical to an agent already in the archive. Discarding.")
+                    log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) duplicated an existing archive agent.")
+                    continue
                 
-            # --- VALIDATION 2: Model Regex Guard ---
-            if not validate_agent_model_usage(new_code, task_model):
-                print(f"    Child {child_id} failed model validation. Discarding.")
-                log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) failed model validation.")
-                continue
-
-            child_filename = f"math_agent_{child_id}.py"
-            child_path = os.path.join(agent_folder, child_filename)
-            save_agent_code(agent_folder, child_filename, new_code)
-            
-            # Log the generation data
-            log_event(f"child_{child_id}_generation_data.json", {
-                "child_id": child_id,
-                "parent_id": parent_agent['id'],
-                "failures_sent": failures,
-                "successes_sent": success_examples_to_send
-            })
+                # --- VALIDATION 2: Model Regex Guard ---
+                if not validate_agent_model_usage(new_code, task_model):
+                    rejected_code_hashes.add(new_code_hash)
+                    print(f"    Child {child_id} failed model validation. Discarding.")
+                    log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) failed model validation.")
+                    continue
+
+                # --- VALIDATION 3: Static Structure Check (before any import) ---
+                is_valid, reason = static_validate(new_code)
+                if not is_valid:
+                    rejected_code_hashes.add(new_code_hash)
+                    print(f"    Child {child_id} failed static validation: {reason} Discarding.")
+                    log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) failed static validation: {reason}")
+                    continue
+
+                child_filename = f"math_agent_{child_id}.py"
+                child_path = os.path.join(agent_folder, child_filename)
+                save_agent_code(agent_folder, child_filename, new_code)
             
-            child_module = load_agent_from_file(child_path, child_id)
+                # Log the generation data
+                log_event(f"child_{child_id}_generation_data.json", {
+                    "child_id": child_id,
+                    "parent_id": parent_agent['id'],
+                    "failures_sent": failures,
+                    "successes_sent": success_examples_to_send
+                })
             
-            # if c.is_valid()
-            if child_module is not None and hasattr(child_module, 'run_agent'):
-                print(f"    Child {child_id} is FUNCTIONAL.")
-                parent_agent['children_count'] += 1
+                # if c.is_valid(): it loads and its graph builds
+                child_module, is_functional, reason = _load_checked_agent(child_path, child_id, eval_pool)
+                if is_functional:
+                    print(f"    Child {child_id} is FUNCTIONAL.")
+                    parent_agent['children_count'] += 1
                 
-                # s <- evaluate(c, B)
-                child_score = evaluate_agent_on_dataset(child_module, validation_data)
+                    # s <- evaluate(c, B)
+                    child_eval = evaluate_on_validation(
+                        child_module, validation_data, child_path, task_model,
+                        parent_prefix_score=parent_agent['prefix_score'],
+                        pool=eval_pool
+                    )
                 
-                # A <- A ∪ {(c, s)}
-                child_agent_data = {
-                    'id': child_id,
-                    'path': child_path,
-                    'score': child_score,
-                    'children_count': 0,
-                    'parent_id': parent_agent['id']
-                }
-                archive.append(child_agent_data)
-                log_event("archive.log", child_agent_data) # Log child to main archive log
-            else:
-                print(f"    Child {child_id} is NOT functional (failed to load). Discarding.")
-                log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) was NOT functional.")
-                try:
-                    os.remove(child_path) # Clean up invalid agent
-                except OSError:
-                    pass
+                    # A <- A ∪ {(c, s)}
+                    child_agent_data = {
+                        'id': child_id,
+                        'path': child_path,
+                        'score': child_eval['score'],
+                        'prefix_score': child_eval['prefix_score'],
+                        'partial': child_eval['partial'],
+                        'children_count': 0,
+                        'parent_id': parent_agent['id'],
+                        'code': new_code,
+                        'code_hash': new_code_hash
+                    }
+                    archive.append(child_agent_data)
+                    archive_code_hashes.add(new_code_hash)
+                    log_event("archive.log", _archive_log_record(child_agent_data)) # Log child to main archive log
+                    cache_developer_code(developer_request, new_code)
+                else:
+                    rejected_code_hashes.add(new_code_hash)
+                    print(f"    Child {child_id} is NOT functional ({reason}). Discarding.")
+                    log_event("invalid_agents.log", f"Child {child_id} (parent {parent_agent['id']}) was NOT functional: {reason}")
+                    try:
+                        os.remove(child_path) # Clean up invalid agent
+                    except OSError:
+                        pass
+    finally:
+        if eval_pool is not None:
+            eval_pool.close()
 
     print("\n" + "=" * 52)
     print("DGM EVOLUTION LOOP COMPLETE.")
@@ -222,7 +329,7 @@ def run_dgm_loop(dataset,
         return None
 
     sorted_archive = sorted(archive, key=lambda x: x['score'], reverse=True)
-    log_event("archive_final.json", sorted_archive)
+    log_event("archive_final.json", [_archive_log_record(agent) for agent in sorted_archive], pretty=True)
     
     print("\nFinal Agent Archive (sorted by validation score):")
     for i, agent in enumerate(sorted_archive):
@@ -1,73 +1,408 @@
+import io
 import os
 import sys
-import json
+import atexit
+import signal
+import platform
 import datetime
-from openai import OpenAI
+import threading
+import orjson
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 from src import config
 
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
 
-# --- OpenAI Client ---
 try:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("Error: OPENAI_API_KEY environment variable not set.", file=sys.stderr)
-        sys.exit(1)
-    client = OpenAI(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}", file=sys.stderr)
-    sys.exit(1)
+    import liburing  # Optional: batched log writes through io_uring on Linux
+except ImportError:
+    liburing = None
 
 
+# --- OpenAI Client (created on first use) ---
+# Importing openai pulls in httpx and pydantic, which logging-only users never need
+_client = None
+_api_key = None
+_CLIENT_LOCK = threading.Lock()
+
+def _get_api_key() -> str:
+    """Loads .env and returns OPENAI_API_KEY, exiting if it is not set."""
+    global _api_key
+    if _api_key is None:
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            print("Error: OPENAI_API_KEY environment variable not set.", file=sys.stderr)
+            sys.exit(1)
+        _api_key = api_key
+    return _api_key
+
+def get_client() -> "OpenAI":
+    """Returns the shared OpenAI client, creating it on the first call."""
+    global _client
+    if _client is not None:
+        return _client
+    with _CLIENT_LOCK:
+        if _client is None:
+            try:
+                from openai import OpenAI
+                _client = OpenAI(api_key=_get_api_key())
+            except Exception as e:
+                print(f"Error initializing OpenAI client: {e}", file=sys.stderr)
+                sys.exit(1)
+    return _client
+
+def new_async_client() -> "AsyncOpenAI":
+    """Creates an AsyncOpenAI client. Use one per event loop."""
+    from openai import AsyncOpenAI
+    with _CLIENT_LOCK:
+        api_key = _get_api_key()
+    return AsyncOpenAI(api_key=api_key)
+
+
+# numpy values (e.g. scores) and non-str keys are serialized natively
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+_ORJSON_PRETTY_OPTIONS = _ORJSON_OPTIONS | orjson.OPT_INDENT_2
+
+# Resolved log paths by filename, for the current LOG_FOLDER (cleared by setup_logging)
+_PATH_CACHE: dict[str, str] = {}
+
+# --- Batched Log Writes ---
+_FLUSH_INTERVAL_MS = int(os.getenv("SASS_LOG_FLUSH_MS", "50"))
+_MAX_BATCH = int(os.getenv("SASS_LOG_MAX_BATCH", "100"))  # Records per file that trigger an early flush
+
+_LOG_BUFFERS: dict[str, list[bytes]] = {}  # Pending records per log path
+_LOG_HANDLES: dict[str, io.BufferedWriter] = {}  # Open append handles, reused across flushes
+_HANDLE_BUFFER_SIZE = 64 * 1024
+_HAS_WRITEV = hasattr(os, "writev")  # POSIX only; elsewhere batches are joined and written
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = -1
+if _IOV_MAX <= 0:
+    _IOV_MAX = 1024  # POSIX minimum is 16; Linux and macOS both allow 1024
+_LOG_LOCK = threading.Lock()
+_FLUSH_LOCK = threading.Lock()
+_FLUSH_WAKEUP = threading.Event()
+_flusher_thread = None
+_previous_sigterm_handler = None
+
+# --- io_uring Writeback (optional, Linux >= 5.1 with `liburing` installed) ---
+_IO_URING_ENABLED = os.getenv("SASS_LOG_IO_URING", "1") != "0"
+_IO_URING_ENTRIES = 256
+_IO_URING_MIN_KERNEL = (5, 1)
+_uring_engine = None
+_uring_unavailable = False
+
 def setup_logging(log_dir: str):
     """Creates the unique log directory for this run."""
+    log_dir = os.fspath(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
     config.LOG_FOLDER = log_dir
-    if not os.path.exists(config.LOG_FOLDER):
-        os.makedirs(config.LOG_FOLDER)
+    _PATH_CACHE.clear()
     print(f"Logs will be saved in: {config.LOG_FOLDER}")
 
-def log_event(filename, data):
-    """Logs a dictionary or string to a file in the run's log directory."""
+def log_event(filename, data, *, pretty=False,
+              _dumps=orjson.dumps, _isinstance=isinstance, _cache=_PATH_CACHE):
+    """
+    Logs a dictionary or string to a file in the run's log directory.
+    Dicts and lists are written as compact JSON; `pretty=True` indents them.
+    Bytes are taken as an already-serialized record and written verbatim,
+    so they must carry their own trailing newline.
+    Records are buffered and written in batches by a background thread;
+    call `flush_logs()` to force them to disk.
+    """
     if not config.LOG_FOLDER:
         print(f"Warning: LOG_FOLDER not set. Cannot log: {filename}", file=sys.stderr)
         return
         
-    log_path = os.path.join(config.LOG_FOLDER, filename)
+    # The trailing keyword defaults bind hot globals as locals; callers never pass them
+    log_path = _cache.get(filename)
+    if log_path is None:
+        log_path = _cache.setdefault(filename, os.path.join(config.LOG_FOLDER, filename))
     try:
-        with open(log_path, 'a', encoding='utf-8') as f:
-            if isinstance(data, dict) or isinstance(data, list):
-                f.write(json.dumps(data, indent=2) + "\n")
-            else:
-                f.write(str(data) + "\n")
+        if _isinstance(data, bytes):
+            record = data
+        elif _isinstance(data, (dict, list)):
+            # Values orjson cannot serialize fall back to str()
+            record = _dumps(data, default=str, option=_ORJSON_PRETTY_OPTIONS if pretty else _ORJSON_OPTIONS) + b"\n"
+        else:
+            record = str(data).encode('utf-8') + b"\n"
     except Exception as e:
         print(f"Warning: Failed to write log to {filename}. Error: {e}", file=sys.stderr)
+        return
+
+    _ensure_flusher()
+    with _LOG_LOCK:
+        batch = _LOG_BUFFERS.setdefault(log_path, [])
+        batch.append(record)
+        batch_full = len(batch) >= _MAX_BATCH
+    if batch_full:
+        _FLUSH_WAKEUP.set()
+
+def _write_all(fd: int, data: memoryview):
+    """Writes `data` to `fd`, retrying short writes."""
+    while data:
+        data = data[os.write(fd, data):]
+
+def _writev_all(fd: int, parts: list[bytes]):
+    """Writes `parts` to `fd` with os.writev (at most IOV_MAX buffers per call), retrying short writes."""
+    start = 0
+    while start < len(parts):
+        chunk = parts[start:start + _IOV_MAX]
+        written = os.writev(fd, chunk)
+        start += len(chunk)
+        if written == sum(len(part) for part in chunk):
+            continue
+        # Short write: finish the partly written buffer, then resume from the next one
+        for index, part in enumerate(chunk):
+            if written < len(part):
+                _write_all(fd, memoryview(part)[written:])
+                start -= len(chunk) - index - 1
+                break
+            written -= len(part)
+
+class IoUringBatchEngine:
+    """
+    Writes one flush cycle's batches through a single io_uring: one write per
+    log file is queued and the whole cycle costs one io_uring_enter() instead
+    of one write() per file. Not thread-safe; flush_logs holds _FLUSH_LOCK.
+    """
+
+    def __init__(self, entries: int = _IO_URING_ENTRIES):
+        self._entries = entries
+        self._ring = liburing.Ring()
+        self._cqe = liburing.Cqe()
+        liburing.io_uring_queue_init(entries, self._ring, 0)
+        self._fds: dict[str, int] = {}  # O_APPEND fds, so the kernel picks each write's offset
+
+    def _fd(self, log_path: str) -> int:
+        fd = self._fds.get(log_path)
+        if fd is None:
+            fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self._fds[log_path] = fd
+        return fd
+
+    def write_batches(self, batches: dict[str, bytes]):
+        """
+        Writes each path's data. Completed paths are removed from `batches`, so
+        if this raises, the caller can write what is left another way.
+        """
+        while batches:
+            self._submit(list(batches.items())[:self._entries], batches)
+
+    def _submit(self, items: list[tuple[str, bytes]], batches: dict[str, bytes]):
+        pending = []  # Keeps each buffer alive until its completion is reaped
+        for log_path, data in items:
+            try:
+                fd = self._fd(log_path)
+            except OSError as e:
+                print(f"Warning: Failed to write log to {log_path}. Error: {e}", file=sys.stderr)
+                del batches[log_path]
+                continue
+            sqe = liburing.io_uring_get_sqe(self._ring)
+            liburing.io_uring_prep_write(sqe, fd, data)
+            liburing.io_uring_sqe_set_data64(sqe, len(pending))
+            pending.append((log_path, fd, data))
+        if not pending:
+            return
+
+        liburing.io_uring_submit(self._ring)
+        for _ in pending:
+            liburing.io_uring_wait_cqe(self._ring, self._cqe)
+            cqe = self._cqe[0]
+            index, res = cqe.user_data, cqe.res
+            liburing.io_uring_cqe_seen(self._ring, cqe)
+            log_path, fd, data = pending[index]
+            del batches[log_path]
+            try:
+                if res < 0:
+                    raise OSError(-res, os.strerror(-res))
+                if res < len(data):
+                    _write_all(fd, memoryview(data)[res:])
+            except OSError as e:
+                print(f"Warning: Failed to write log to {log_path}. Error: {e}", file=sys.stderr)
+
+    def close(self):
+        liburing.io_uring_queue_exit(self._ring)
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds.clear()
+
+def _kernel_version() -> tuple[int, ...]:
+    """Returns the running kernel's (major, minor), or (0, 0) if it cannot be parsed."""
+    try:
+        return tuple(int(part) for part in platform.release().split("-")[0].split(".")[:2])
+    except ValueError:
+        return (0, 0)
+
+def _get_uring_engine():
+    """Returns the io_uring engine, creating it on first use; None means use plain writes."""
+    global _uring_engine, _uring_unavailable
+    if _uring_engine is not None or _uring_unavailable:
+        return _uring_engine
+    _uring_unavailable = True
+    if (not _IO_URING_ENABLED or liburing is None or not sys.platform.startswith("linux")
+            or _kernel_version() < _IO_URING_MIN_KERNEL):
+        return None
+    try:
+        _uring_engine = IoUringBatchEngine()
+        _uring_unavailable = False
+    except Exception as e:
+        # e.g. io_uring disabled by seccomp or sysctl
+        print(f"Warning: io_uring unavailable, using buffered log writes. Error: {e}", file=sys.stderr)
+    return _uring_engine
+
+def _disable_uring_engine():
+    global _uring_engine
+    try:
+        _uring_engine.close()
+    except Exception:
+        pass
+    _uring_engine = None
+
+def flush_logs():
+    """Writes all buffered log records to disk (one write per file)."""
+    # _FLUSH_LOCK keeps concurrent flushes from reordering a file's batches
+    with _FLUSH_LOCK:
+        with _LOG_LOCK:
+            if not _LOG_BUFFERS:
+                return
+            batches = dict(_LOG_BUFFERS)
+            _LOG_BUFFERS.clear()
+
+        engine = _get_uring_engine()
+        if engine is not None:
+            joined = {log_path: b"".join(batch) for log_path, batch in batches.items()}
+            try:
+                engine.write_batches(joined)
+                return
+            except Exception as e:
+                print(f"Warning: io_uring log write failed, using buffered log writes. Error: {e}", file=sys.stderr)
+                _disable_uring_engine()
+                # Only the paths the ring did not finish are left
+                batches = {log_path: [data] for log_path, data in joined.items()}
+
+        for log_path, batch in batches.items():
+            try:
+                f = _LOG_HANDLES.get(log_path)
+                if f is None:
+                    f = _LOG_HANDLES.setdefault(log_path, open(log_path, 'ab', buffering=_HANDLE_BUFFER_SIZE))
+                if _HAS_WRITEV:
+                    # Hand the records to the kernel as an iovec instead of joining them first
+                    f.flush()
+                    _writev_all(f.fileno(), batch)
+                else:
+                    f.write(b"".join(batch))
+                    f.flush()
+            except Exception as e:
+                print(f"Warning: Failed to write log to {log_path}. Error: {e}", file=sys.stderr)
+
+def _close_log_handles():
+    """Flushes pending records and closes the cached log files (at exit)."""
+    flush_logs()
+    with _FLUSH_LOCK:
+        for f in _LOG_HANDLES.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+        _LOG_HANDLES.clear()
+        if _uring_engine is not None:
+            _disable_uring_engine()
+
+def _flusher_loop():
+    while True:
+        _FLUSH_WAKEUP.wait(_FLUSH_INTERVAL_MS / 1000)
+        _FLUSH_WAKEUP.clear()
+        flush_logs()
+
+def _handle_sigterm(signum, frame):
+    # Takes no locks: the interrupted code may be inside `with _LOG_LOCK:`. Exiting
+    # unwinds those blocks first, then atexit's _close_log_handles does the flush.
+    if callable(_previous_sigterm_handler):
+        _previous_sigterm_handler(signum, frame)
+    raise SystemExit(128 + signum)
+
+def _ensure_flusher():
+    """Starts the background flusher (and the exit hooks) on first use."""
+    global _flusher_thread, _previous_sigterm_handler
+    if _flusher_thread is not None:
+        return
+    with _LOG_LOCK:
+        if _flusher_thread is not None:
+            return
+        atexit.register(_close_log_handles)
+        if threading.current_thread() is threading.main_thread():
+            # SIG_IGN (or a handler installed outside Python) is left in place
+            previous = signal.getsignal(signal.SIGTERM)
+            if previous is signal.SIG_DFL or callable(previous):
+                _previous_sigterm_handler = previous
+                signal.signal(signal.SIGTERM, _handle_sigterm)
+        _flusher_thread = threading.Thread(target=_flusher_loop, name="log-flusher", daemon=True)
+        _flusher_thread.start()
+
+
+# (prompt, completion) cost per token, filled from config.MODEL_COSTS on each model's first use
+_COST_CACHE: dict[str, tuple[float, float]] = {}
+_ZERO = (0.0, 0.0)  # Models missing from MODEL_COSTS
+# One-slot (model, costs) memo in front of _COST_CACHE: a run bills almost every call
+# to the same model. A single tuple, so concurrent callers always read a matching pair.
+_last_model_cost = (None, _ZERO)
 
+# Rendered get_final_token_summary() text; _summary_dirty is set whenever the counters change
+_summary_cache = None
+_summary_dirty = True
 
 def update_token_stats(response, model_name):
     """Updates the global token and cost counters."""
+    global _last_model_cost, _summary_dirty
     if not response or not response.usage:
         return
     
     prompt_tokens = response.usage.prompt_tokens
     completion_tokens = response.usage.completion_tokens
     
-    config.token_usage_stats["total_prompt_tokens"] += prompt_tokens
-    config.token_usage_stats["total_completion_tokens"] += completion_tokens
+    stats = config.token_usage_stats
+    stats["total_prompt_tokens"] += prompt_tokens
+    stats["total_completion_tokens"] += completion_tokens
     
-    costs = config.MODEL_COSTS.get(model_name, {"prompt": 0, "completion": 0})
-    cost = (prompt_tokens * costs["prompt"]) + (completion_tokens * costs["completion"])
-    config.token_usage_stats["total_cost_usd"] += cost
+    last_model, model_costs = _last_model_cost
+    # Callers pass the same model string object each time, so identity is enough here;
+    # a miss only falls through to the dict lookup
+    if model_name is not last_model:
+        model_costs = _COST_CACHE.get(model_name)
+        if model_costs is None:
+            costs = config.MODEL_COSTS.get(model_name)
+            model_costs = _COST_CACHE.setdefault(
+                model_name, (costs["prompt"], costs["completion"]) if costs else _ZERO
+            )
+        _last_model_cost = (model_name, model_costs)
+    prompt_cost, completion_cost = model_costs
+    cost = (prompt_tokens * prompt_cost) + (completion_tokens * completion_cost)
+    stats["total_cost_usd"] += cost
+    _summary_dirty = True
 
-    log_event("token_usage.log", 
-              f"Model: {model_name}, Prompt: {prompt_tokens}, Completion: {completion_tokens}, Cost: ${cost:.6f}")
+    # Formatted straight to bytes; log_event buffers bytes records as they are
+    log_event("token_usage.log",
+              b"Model: %s, Prompt: %d, Completion: %d, Cost: $%.6f\n"
+              % (model_name.encode('utf-8'), prompt_tokens, completion_tokens, cost))
 
 def get_final_token_summary() -> str:
     """Returns a formatted string of the final token usage and cost."""
-    summary = (
+    global _summary_cache, _summary_dirty
+    if not _summary_dirty:
+        return _summary_cache
+    # Clear the flag before reading the counters, so an update racing with this render re-dirties it
+    _summary_dirty = False
+    _summary_cache = (
         "\n--- Meta-Model API Usage (Evolution) ---\n"
         f"Total Prompt Tokens:   {config.token_usage_stats['total_prompt_tokens']}\n"
         f"Total Completion Tokens: {config.token_usage_stats['total_completion_tokens']}\n"
         f"Estimated Total Cost:  ${config.token_usage_stats['total_cost_usd']:.6f}"
     )
-    return summary
\ No newline at end of file
+    return _summary_cache